@@ -0,0 +1,61 @@
+import socket
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+HOST = "localhost"
+TIMEOUT = 30
+# Base dédiée au benchmark : le login ne doit pas créer de joueur dans la vraie base
+BENCH_DB_NAME = os.environ.get("MORPION_BENCH_DB_NAME", "morpion_game_bench")
+
+GAME_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind((HOST, 0))
+        return s.getsockname()[1]
+
+def measure_import():
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import server"], cwd=GAME_DIR, check=True)
+    return time.perf_counter() - start
+
+def measure_first_login(port, snapshot_path):
+    env = dict(os.environ, MORPION_DB_NAME=BENCH_DB_NAME)
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "server.py", str(port), snapshot_path], cwd=GAME_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        # Attendre que le serveur accepte les connexions
+        while True:
+            if time.perf_counter() - start > TIMEOUT:
+                raise TimeoutError("Server did not start")
+            try:
+                client_socket = socket.create_connection((HOST, port))
+                break
+            except ConnectionRefusedError:
+                time.sleep(0.005)
+        accepted = time.perf_counter() - start
+
+        client_socket.settimeout(TIMEOUT)
+        client_socket.send(json.dumps({"action": "login", "username": "bench_startup"}).encode('utf-8'))
+        response = json.loads(client_socket.recv(1024).decode('utf-8'))
+        logged_in = time.perf_counter() - start
+        client_socket.close()
+
+        return accepted, logged_in, response.get("action")
+    finally:
+        process.terminate()
+        process.wait()
+
+if __name__ == "__main__":
+    import_time = measure_import()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        accepted, logged_in, action = measure_first_login(free_port(), os.path.join(tmp_dir, "snapshot.json"))
+
+    print(f"Import (interpreter + server module): {import_time * 1000:.1f} ms")
+    print(f"First accepted connection: {accepted * 1000:.1f} ms")
+    print(f"First login response ({action}): {logged_in * 1000:.1f} ms")
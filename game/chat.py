@@ -0,0 +1,142 @@
+import threading
+import queue
+import time
+from collections import deque
+from datetime import datetime
+
+CHAT_HISTORY_SIZE = 50
+CHAT_LOG_FLUSH_SIZE = 50
+CHAT_FLUSH_INTERVAL = 0.05
+PERSIST_RETRY_DELAY = 2
+PERSIST_MAX_ATTEMPTS = 5
+
+class ChatRoom:
+    def __init__(self, game_id):
+        self.game_id = game_id
+        self.history = deque(maxlen=CHAT_HISTORY_SIZE)
+        self.log = []
+        self.pending = {}
+
+class ChatManager:
+    def __init__(self, database_factory):
+        self.database_factory = database_factory
+        self.rooms = {}
+        self.lock = threading.Lock()
+        self.persist_queue = queue.Queue()
+
+        self.flush_thread = threading.Thread(target=self.flush_loop)
+        self.flush_thread.daemon = True
+        self.flush_thread.start()
+
+        self.persist_thread = threading.Thread(target=self.persist_loop)
+        self.persist_thread.daemon = True
+        self.persist_thread.start()
+
+    def open_room(self, game_id, history=None, log=None):
+        with self.lock:
+            room = ChatRoom(game_id)
+            if history:
+                room.history.extend(history)
+            if log:
+                room.log.extend((game_id, player_id, content, datetime.fromisoformat(sent_at))
+                                for player_id, content, sent_at in log)
+            self.rooms[game_id] = room
+
+    def post(self, game_id, sender, recipient, content):
+        now = datetime.now()
+        chat_message = {
+            "from": sender.username,
+            "message": content,
+            "time": now.strftime("%H:%M:%S")
+        }
+
+        with self.lock:
+            room = self.rooms.get(game_id)
+            if room is None:
+                return False
+            room.history.append(chat_message)
+            room.log.append((game_id, sender.id, content, now))
+            # Enregistrer par paquets pendant la partie : le log en mémoire (et dans le snapshot) reste borné
+            if len(room.log) >= CHAT_LOG_FLUSH_SIZE:
+                self.persist_queue.put((room.log, 1))
+                room.log = []
+            room.pending.setdefault(recipient, []).append(chat_message)
+        return True
+
+    def get_history(self, game_id):
+        with self.lock:
+            room = self.rooms.get(game_id)
+            return list(room.history) if room else []
+
+    def get_log(self, game_id):
+        # Messages pas encore enregistrés en base, sous une forme sérialisable pour le snapshot
+        with self.lock:
+            room = self.rooms.get(game_id)
+            if room is None:
+                return []
+            return [[player_id, content, sent_at.isoformat()] for _, player_id, content, sent_at in room.log]
+
+    def close_room(self, game_id):
+        with self.lock:
+            room = self.rooms.pop(game_id, None)
+        if room is None:
+            return
+
+        self.send_pending(room.pending)
+        if room.log:
+            self.persist_queue.put((room.log, 1))
+
+    def send_pending(self, pending):
+        for recipient, messages in pending.items():
+            # Regrouper les messages reçus depuis le dernier envoi dans une seule trame
+            if len(messages) == 1:
+                recipient.send({"action": "chat_message", **messages[0]})
+            else:
+                recipient.send({"action": "chat_batch", "messages": messages})
+
+    def flush_loop(self):
+        while True:
+            time.sleep(CHAT_FLUSH_INTERVAL)
+            try:
+                outgoing = []
+                with self.lock:
+                    for room in self.rooms.values():
+                        if room.pending:
+                            outgoing.append(room.pending)
+                            room.pending = {}
+
+                for pending in outgoing:
+                    self.send_pending(pending)
+            except Exception as e:
+                print(f"Error flushing chat: {str(e)}")
+
+    def persist_loop(self):
+        # Connexion dédiée : le curseur de la base principale n'est pas partagé entre threads
+        db = None
+        while True:
+            rows, attempt = self.persist_queue.get()
+            # Vider la file pour écrire toutes les parties terminées en une seule requête
+            while not self.persist_queue.empty():
+                more_rows, more_attempt = self.persist_queue.get_nowait()
+                rows = rows + more_rows
+                attempt = max(attempt, more_attempt)
+
+            try:
+                if db is None:
+                    db = self.database_factory()
+                db.add_chat_messages(rows)
+            except Exception as e:
+                # La connexion est peut-être cassée : en ouvrir une nouvelle et réessayer le lot
+                if db is not None:
+                    try:
+                        db.close()
+                    except Exception:
+                        pass
+                db = None
+
+                if attempt >= PERSIST_MAX_ATTEMPTS:
+                    print(f"Error saving chat messages: {str(e)}, dropping {len(rows)} messages")
+                    continue
+                print(f"Error saving chat messages: {str(e)}, retrying in {PERSIST_RETRY_DELAY}s")
+                self.persist_queue.put((rows, attempt + 1))
+                time.sleep(PERSIST_RETRY_DELAY)
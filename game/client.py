@@ -1,15 +1,17 @@
-import socket
-import json
-import threading
 import tkinter as tk
 from tkinter import messagebox, scrolledtext
 from datetime import datetime
+from network import Connection, coalesce
+
+POLL_INTERVAL = 20
+MESSAGE_BATCH_SIZE = 100
 
 class TicTacToeClient:
     def __init__(self, host="localhost", port=5555):
         self.host = host
         self.port = port
-        self.client_socket = None
+        self.connection = None
+        self.processing_messages = False
         self.username = None
         self.player_id = None
         self.in_queue = False
@@ -110,6 +112,7 @@ class TicTacToeClient:
         self.root.protocol("WM_DELETE_WINDOW", self.on_close)
 
     def start(self):
+        self.root.after(POLL_INTERVAL, self.process_messages)
         self.root.mainloop()
 
     def connect(self):
@@ -126,18 +129,15 @@ class TicTacToeClient:
             self.host = host
             self.port = port
 
-            self.client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.client_socket.connect((self.host, self.port))
+            connection = Connection(self.host, self.port)
+            connection.connect()
+            self.connection = connection
 
             login_message = {
                 "action": "login",
                 "username": self.username
             }
-            self.client_socket.send(json.dumps(login_message).encode('utf-8'))
-
-            self.listen_thread = threading.Thread(target=self.listen_for_messages)
-            self.listen_thread.daemon = True
-            self.listen_thread.start()
+            self.connection.send(login_message)
 
             self.login_frame.pack_forget()
             self.main_frame.pack(fill=tk.BOTH, expand=True)
@@ -147,124 +147,135 @@ class TicTacToeClient:
         except Exception as e:
             messagebox.showerror("Erreur de connexion", str(e))
 
-    def listen_for_messages(self):
+    def process_messages(self):
+        # Appelé dans la boucle Tk : les widgets ne sont jamais touchés depuis le thread réseau.
+        # Une seule boucle de lecture : un appel imbriqué (boucle Tk d'une boîte de dialogue) ne fait rien
+        # et c'est l'appel en cours qui reprogramme le suivant.
+        if self.processing_messages:
+            return
+        self.processing_messages = True
         try:
-            while True:
-                data = self.client_socket.recv(1024).decode('utf-8')
-                if not data:
-                    break
+            if self.connection:
+                for message in coalesce(self.connection.get_messages(MESSAGE_BATCH_SIZE)):
+                    try:
+                        self.handle_message(message)
+                    except Exception as e:
+                        print(f"Erreur lors du traitement de {message.get('action')}: {str(e)}")
+        finally:
+            self.processing_messages = False
+        self.root.after(POLL_INTERVAL, self.process_messages)
+
+    def show_dialog(self, dialog, title, text):
+        # Boîte de dialogue ouverte après le lot en cours, pour ne pas l'interrompre
+        self.root.after_idle(lambda: dialog(title, text))
 
-                try:
-                    message = json.loads(data)
-                    action = message.get("action")
+    def handle_message(self, message):
+        action = message.get("action")
 
-                    if action == "login_success":
-                        self.player_id = message.get("player_id")
+        if action == "login_success":
+            self.player_id = message.get("player_id")
 
-                    elif action == "joined_queue":
-                        self.in_queue = True
-                        self.join_queue_button.config(state=tk.DISABLED)
-                        self.leave_queue_button.config(state=tk.NORMAL)
+        elif action == "joined_queue":
+            self.in_queue = True
+            self.join_queue_button.config(state=tk.DISABLED)
+            self.leave_queue_button.config(state=tk.NORMAL)
 
-                    elif action == "left_queue":
-                        self.in_queue = False
-                        self.join_queue_button.config(state=tk.NORMAL)
-                        self.leave_queue_button.config(state=tk.DISABLED)
+        elif action == "left_queue":
+            self.in_queue = False
+            self.join_queue_button.config(state=tk.NORMAL)
+            self.leave_queue_button.config(state=tk.DISABLED)
 
-                    elif action == "queue_update":
-                        queue_length = message.get("queue_length", 0)
-                        players = message.get("players", [])
+        elif action == "queue_update":
+            queue_length = message.get("queue_length", 0)
+            players = message.get("players", [])
 
-                        self.queue_info.config(text=f"Joueurs en attente: {queue_length}")
+            self.queue_info.config(text=f"Joueurs en attente: {queue_length}")
 
-                        self.queue_list.config(state=tk.NORMAL)
-                        self.queue_list.delete(1.0, tk.END)
+            self.queue_list.config(state=tk.NORMAL)
+            self.queue_list.delete(1.0, tk.END)
 
-                        for i, player in enumerate(players, 1):
-                            self.queue_list.insert(tk.END, f"{i}. {player['username']} (depuis {player['join_time']})\n")
+            for i, player in enumerate(players, 1):
+                self.queue_list.insert(tk.END, f"{i}. {player['username']} (depuis {player['join_time']})\n")
 
-                        self.queue_list.config(state=tk.DISABLED)
+            self.queue_list.config(state=tk.DISABLED)
 
-                    elif action == "game_start":
-                        self.in_game = True
-                        self.in_queue = False
-                        self.opponent = message.get("opponent")
-                        self.symbol = message.get("symbol")
-                        self.my_turn = message.get("your_turn")
+        elif action == "game_start":
+            self.in_game = True
+            self.in_queue = False
+            self.opponent = message.get("opponent")
+            self.symbol = message.get("symbol")
+            self.my_turn = message.get("your_turn")
 
-                        self.game_info.config(text=f"Match contre {self.opponent} - Vous êtes {self.symbol}")
+            self.game_info.config(text=f"Match contre {self.opponent} - Vous êtes {self.symbol}")
 
-                        if self.my_turn:
-                            self.enable_board()
-                        else:
-                            self.disable_board()
+            if self.my_turn:
+                self.enable_board()
+            else:
+                self.disable_board()
 
-                        self.chat_display.config(state=tk.NORMAL)
-                        self.chat_display.delete(1.0, tk.END)
-                        self.chat_display.config(state=tk.DISABLED)
+            self.chat_display.config(state=tk.NORMAL)
+            self.chat_display.delete(1.0, tk.END)
+            self.chat_display.config(state=tk.DISABLED)
 
-                    elif action == "game_update":
-                        game_state = message.get("game_state", {})
-                        board = game_state.get("board", [" " for _ in range(9)])
-                        self.my_turn = game_state.get("current_turn") == self.username
+        elif action == "game_resume":
+            self.in_game = True
+            self.in_queue = False
+            self.opponent = message.get("opponent")
+            self.symbol = message.get("symbol")
 
-                        self.board = board
-                        for i in range(9):
-                            self.buttons[i].config(text=board[i])
+            self.join_queue_button.config(state=tk.DISABLED)
+            self.leave_queue_button.config(state=tk.DISABLED)
 
-                        if self.my_turn and not game_state.get("finished", False):
-                            self.enable_board()
-                            self.game_info.config(text=f"C'est votre tour - Vous êtes {self.symbol}")
-                        else:
-                            self.disable_board()
-                            if not game_state.get("finished", False):
-                                self.game_info.config(text=f"Tour de {self.opponent} - Vous êtes {self.symbol}")
+            self.update_board(message.get("game_state", {}))
 
-                    elif action == "game_over":
-                        winner = message.get("winner")
-                        game_message = message.get("message")
+            self.chat_display.config(state=tk.NORMAL)
+            self.chat_display.delete(1.0, tk.END)
+            self.chat_display.config(state=tk.DISABLED)
+            for chat_message in message.get("chat_history", []):
+                self.show_chat_message(chat_message)
 
-                        self.game_info.config(text=game_message)
-                        messagebox.showinfo("Fin de partie", game_message)
+        elif action == "game_update":
+            self.update_board(message.get("game_state", {}))
 
-                        self.in_game = False
-                        self.join_queue_button.config(state=tk.NORMAL)
-                        self.disable_board()
+        elif action == "game_over":
+            winner = message.get("winner")
+            game_message = message.get("message")
 
-                        self.get_stats()
+            self.game_info.config(text=game_message)
+            self.show_dialog(messagebox.showinfo, "Fin de partie", game_message)
 
-                    elif action == "chat_message":
-                        from_player = message.get("from")
-                        msg = message.get("message")
-                        time_str = message.get("time")
+            self.in_game = False
+            self.join_queue_button.config(state=tk.NORMAL)
+            self.disable_board()
 
-                        self.chat_display.config(state=tk.NORMAL)
-                        self.chat_display.insert(tk.END, f"[{time_str}] {from_player}: {msg}\n")
-                        self.chat_display.see(tk.END)
-                        self.chat_display.config(state=tk.DISABLED)
+            self.get_stats()
 
-                    elif action == "stats":
-                        total_games = message.get("total_games", 0)
-                        wins = message.get("wins", 0)
-                        losses = message.get("losses", 0)
+        elif action == "chat_message":
+            self.show_chat_message(message)
 
-                        self.stats_label.config(text=f"Parties: {total_games} | Victoires: {wins} | Défaites: {losses}")
+        elif action == "chat_batch":
+            for chat_message in message.get("messages", []):
+                self.show_chat_message(chat_message)
 
-                    elif action == "error":
-                        error_message = message.get("message", "Une erreur s'est produite")
-                        messagebox.showerror("Erreur", error_message)
+        elif action == "stats":
+            total_games = message.get("total_games", 0)
+            wins = message.get("wins", 0)
+            losses = message.get("losses", 0)
 
-                except json.JSONDecodeError:
-                    print(f"Données invalides reçues: {data}")
+            self.stats_label.config(text=f"Parties: {total_games} | Victoires: {wins} | Défaites: {losses}")
 
-        except Exception as e:
-            if self.client_socket:
-                messagebox.showerror("Erreur de connexion", f"Déconnecté du serveur: {str(e)}")
-                self.client_socket.close()
-                self.client_socket = None
+        elif action == "error":
+            error_message = message.get("message", "Une erreur s'est produite")
+            self.show_dialog(messagebox.showerror, "Erreur", error_message)
+
+        elif action == "disconnected":
+            if self.connection:
+                self.show_dialog(messagebox.showerror, "Erreur de connexion", f"Déconnecté du serveur: {message.get('message')}")
+                self.connection.close()
+                self.connection = None
 
     def join_queue(self):
-        if not self.client_socket:
+        if not self.connection:
             messagebox.showerror("Erreur", "Non connecté au serveur")
             return
 
@@ -273,10 +284,10 @@ class TicTacToeClient:
             return
 
         join_message = {"action": "join_queue"}
-        self.client_socket.send(json.dumps(join_message).encode('utf-8'))
+        self.connection.send(join_message)
 
     def leave_queue(self):
-        if not self.client_socket:
+        if not self.connection:
             messagebox.showerror("Erreur", "Non connecté au serveur")
             return
 
@@ -285,10 +296,10 @@ class TicTacToeClient:
             return
 
         leave_message = {"action": "leave_queue"}
-        self.client_socket.send(json.dumps(leave_message).encode('utf-8'))
+        self.connection.send(leave_message)
 
     def make_move(self, position):
-        if not self.client_socket or not self.in_game or not self.my_turn:
+        if not self.connection or not self.in_game or not self.my_turn:
             return
 
         if self.board[position] != " ":
@@ -298,12 +309,12 @@ class TicTacToeClient:
             "action": "make_move",
             "position": position
         }
-        self.client_socket.send(json.dumps(move_message).encode('utf-8'))
+        self.connection.send(move_message)
 
         self.disable_board()
 
     def send_chat(self):
-        if not self.client_socket or not self.in_game:
+        if not self.connection or not self.in_game:
             messagebox.showinfo("Info", "Vous n'êtes pas dans un match")
             return
 
@@ -315,7 +326,7 @@ class TicTacToeClient:
             "action": "chat_message",
             "message": message
         }
-        self.client_socket.send(json.dumps(chat_message).encode('utf-8'))
+        self.connection.send(chat_message)
 
         time_str = datetime.now().strftime("%H:%M:%S")
         self.chat_display.config(state=tk.NORMAL)
@@ -325,12 +336,38 @@ class TicTacToeClient:
 
         self.chat_entry.delete(0, tk.END)
 
+    def show_chat_message(self, message):
+        from_player = message.get("from")
+        if from_player == self.username:
+            from_player = "Vous"
+
+        self.chat_display.config(state=tk.NORMAL)
+        self.chat_display.insert(tk.END, f"[{message.get('time')}] {from_player}: {message.get('message')}\n")
+        self.chat_display.see(tk.END)
+        self.chat_display.config(state=tk.DISABLED)
+
     def get_stats(self):
-        if not self.client_socket:
+        if not self.connection:
             return
 
         stats_message = {"action": "get_stats"}
-        self.client_socket.send(json.dumps(stats_message).encode('utf-8'))
+        self.connection.send(stats_message)
+
+    def update_board(self, game_state):
+        board = game_state.get("board", [" " for _ in range(9)])
+        self.my_turn = game_state.get("current_turn") == self.username
+
+        self.board = board
+        for i in range(9):
+            self.buttons[i].config(text=board[i])
+
+        if self.my_turn and not game_state.get("finished", False):
+            self.enable_board()
+            self.game_info.config(text=f"C'est votre tour - Vous êtes {self.symbol}")
+        else:
+            self.disable_board()
+            if not game_state.get("finished", False):
+                self.game_info.config(text=f"Tour de {self.opponent} - Vous êtes {self.symbol}")
 
     def enable_board(self):
         for i in range(9):
@@ -342,11 +379,8 @@ class TicTacToeClient:
             button.config(state=tk.DISABLED)
 
     def on_close(self):
-        if self.client_socket:
-            try:
-                self.client_socket.close()
-            except:
-                pass
+        if self.connection:
+            self.connection.close()
         self.root.destroy()
 
 if __name__ == "__main__":
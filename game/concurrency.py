@@ -0,0 +1,53 @@
+import threading
+
+SHARD_COUNT = 16
+
+class StripedDict:
+    # Dictionnaire découpé en shards ayant chacun leur verrou : deux threads
+    # qui touchent des clés différentes ne se bloquent presque jamais
+    def __init__(self, shard_count=SHARD_COUNT):
+        self.shards = [{} for _ in range(shard_count)]
+        self.locks = [threading.Lock() for _ in range(shard_count)]
+
+    def index(self, key):
+        return hash(key) % len(self.shards)
+
+    def get(self, key, default=None):
+        i = self.index(key)
+        with self.locks[i]:
+            return self.shards[i].get(key, default)
+
+    def __setitem__(self, key, value):
+        i = self.index(key)
+        with self.locks[i]:
+            self.shards[i][key] = value
+
+    def __getitem__(self, key):
+        i = self.index(key)
+        with self.locks[i]:
+            return self.shards[i][key]
+
+    def __contains__(self, key):
+        i = self.index(key)
+        with self.locks[i]:
+            return key in self.shards[i]
+
+    def pop(self, key, default=None):
+        i = self.index(key)
+        with self.locks[i]:
+            return self.shards[i].pop(key, default)
+
+    def values(self):
+        # Copie shard par shard : jamais tous les verrous en même temps
+        result = []
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                result.extend(shard.values())
+        return result
+
+    def __len__(self):
+        total = 0
+        for shard, lock in zip(self.shards, self.locks):
+            with lock:
+                total += len(shard)
+        return total
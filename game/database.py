@@ -1,3 +1,4 @@
+import os
 import mysql.connector
 
 class Database:
@@ -6,7 +7,7 @@ class Database:
             host="localhost",
             user="root",
             password="",
-            database="morpion_game"
+            database=os.environ.get("MORPION_DB_NAME", "morpion_game")
         )
         self.cursor = self.connection.cursor()
 
@@ -46,6 +47,11 @@ class Database:
         self.cursor.execute(query, (winner_id, turns_count, game_id))
         self.connection.commit()
 
+    def add_chat_messages(self, messages):
+        query = "INSERT INTO chat_messages (game_id, player_id, message, sent_at) VALUES (%s, %s, %s, %s)"
+        self.cursor.executemany(query, messages)
+        self.connection.commit()
+
     def get_player_stats(self, player_id):
         query = """
         SELECT COUNT(*) as total_games,
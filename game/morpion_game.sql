@@ -23,6 +23,20 @@ SET time_zone = "+00:00";
 
 -- --------------------------------------------------------
 
+--
+-- Structure de la table `chat_messages`
+--
+
+CREATE TABLE `chat_messages` (
+  `id` int(11) NOT NULL,
+  `game_id` int(11) NOT NULL,
+  `player_id` int(11) DEFAULT NULL,
+  `message` text NOT NULL,
+  `sent_at` datetime DEFAULT current_timestamp()
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_general_ci;
+
+-- --------------------------------------------------------
+
 --
 -- Structure de la table `games`
 --
@@ -53,6 +67,14 @@ CREATE TABLE `players` (
 -- Index pour les tables déchargées
 --
 
+--
+-- Index pour la table `chat_messages`
+--
+ALTER TABLE `chat_messages`
+  ADD PRIMARY KEY (`id`),
+  ADD KEY `game_id` (`game_id`),
+  ADD KEY `player_id` (`player_id`);
+
 --
 -- Index pour la table `games`
 --
@@ -73,6 +95,12 @@ ALTER TABLE `players`
 -- AUTO_INCREMENT pour les tables déchargées
 --
 
+--
+-- AUTO_INCREMENT pour la table `chat_messages`
+--
+ALTER TABLE `chat_messages`
+  MODIFY `id` int(11) NOT NULL AUTO_INCREMENT;
+
 --
 -- AUTO_INCREMENT pour la table `games`
 --
@@ -89,6 +117,13 @@ ALTER TABLE `players`
 -- Contraintes pour les tables déchargées
 --
 
+--
+-- Contraintes pour la table `chat_messages`
+--
+ALTER TABLE `chat_messages`
+  ADD CONSTRAINT `chat_messages_ibfk_1` FOREIGN KEY (`game_id`) REFERENCES `games` (`id`),
+  ADD CONSTRAINT `chat_messages_ibfk_2` FOREIGN KEY (`player_id`) REFERENCES `players` (`id`);
+
 --
 -- Contraintes pour la table `games`
 --
@@ -0,0 +1,141 @@
+import socket
+import json
+import threading
+import queue
+import codecs
+
+MAX_BUFFER_SIZE = 65536
+
+class Connection:
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.socket = None
+        self.messages = queue.Queue()
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        # Décodeur incrémental : un caractère accentué peut être coupé entre deux recv
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+
+    def connect(self):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.connect((self.host, self.port))
+
+        self.listen_thread = threading.Thread(target=self.listen)
+        self.listen_thread.daemon = True
+        self.listen_thread.start()
+
+    def send(self, message):
+        self.socket.send(json.dumps(message).encode('utf-8'))
+
+    def close(self):
+        if self.socket:
+            try:
+                self.socket.close()
+            except OSError:
+                pass
+            self.socket = None
+
+    def listen(self):
+        try:
+            while True:
+                data = self.socket.recv(4096)
+                if not data:
+                    break
+                self.receive(data)
+
+            self.messages.put({"action": "disconnected", "message": "Connexion fermée par le serveur"})
+        except Exception as e:
+            if self.socket:
+                self.messages.put({"action": "disconnected", "message": str(e)})
+
+    def receive(self, data):
+        self.buffer += self.utf8.decode(data)
+        self.buffer = self.parse(self.buffer)
+        if len(self.buffer) > MAX_BUFFER_SIZE:
+            print(f"Données invalides reçues: {self.buffer[:100]}")
+            self.buffer = ""
+
+    def parse(self, buffer):
+        # Le serveur peut envoyer plusieurs objets JSON à la suite dans un même paquet,
+        # ou un objet coupé en deux : on garde la fin incomplète pour le prochain recv
+        position = 0
+        while True:
+            while position < len(buffer) and buffer[position].isspace():
+                position += 1
+            if position == len(buffer):
+                return ""
+
+            if buffer[position] != "{":
+                # Données invalides avant le prochain objet : les ignorer
+                next_object = buffer.find("{", position)
+                if next_object == -1:
+                    next_object = len(buffer)
+                print(f"Données invalides reçues: {buffer[position:next_object]}")
+                position = next_object
+                continue
+
+            try:
+                message, position = self.decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                end = self.frame_end(buffer, position)
+                if end is None:
+                    # Accolade fermante pas encore reçue : objet coupé, attendre la suite
+                    return buffer[position:]
+                print(f"Données invalides reçues: {buffer[position:end]}")
+                position = end
+                continue
+
+            if isinstance(message, dict):
+                self.messages.put(message)
+
+    def frame_end(self, buffer, start):
+        # Fin de l'objet commençant à start d'après les accolades, en ignorant le contenu des chaînes.
+        # None si l'objet n'est pas encore complet.
+        depth = 0
+        in_string = False
+        escaped = False
+        for i in range(start, len(buffer)):
+            c = buffer[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif c == "\\":
+                    escaped = True
+                elif c == '"':
+                    in_string = False
+            elif c == '"':
+                in_string = True
+            elif c in "{[":
+                depth += 1
+            elif c in "}]":
+                depth -= 1
+                if depth == 0:
+                    return i + 1
+        return None
+
+    def get_messages(self, limit):
+        messages = []
+        try:
+            while len(messages) < limit:
+                messages.append(self.messages.get_nowait())
+        except queue.Empty:
+            pass
+        return messages
+
+def coalesce(messages):
+    # Seul le dernier état compte : on ignore les mises à jour remplacées
+    # par une plus récente dans le même lot (sans traverser un début ou une fin de partie)
+    result = []
+    seen = set()
+    for message in reversed(messages):
+        action = message.get("action")
+        if action in ("game_start", "game_resume", "game_over"):
+            seen.discard("game_update")
+        elif action in ("queue_update", "game_update"):
+            if action in seen:
+                continue
+            seen.add(action)
+        result.append(message)
+    result.reverse()
+    return result
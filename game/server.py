@@ -1,9 +1,23 @@
+import time
+
+STARTUP_TIME = time.perf_counter()
+
 import socket
+import sys
 import threading
 import json
-import time
+import signal
 from datetime import datetime
-from database import Database
+from snapshot import Snapshot
+from chat import ChatManager
+from concurrency import StripedDict
+
+SNAPSHOT_INTERVAL = 5
+DB_READY_TIMEOUT = 10
+DB_RETRY_DELAY = 2
+RECLAIM_TIMEOUT = 60
+QUEUE_CHECK_INTERVAL = 1
+RESULT_RETRY_DELAY = 2
 
 class Player:
     def __init__(self, username, client_socket, address):
@@ -13,6 +27,22 @@ class Player:
         self.join_time = datetime.now()
         self.id = None
         self.in_game = False
+        self.game = None
+        self.disconnect_time = None
+        self.send_lock = threading.Lock()
+
+    def send(self, message):
+        data = json.dumps(message).encode('utf-8')
+        # Plusieurs threads écrivent sur la même socket : une trame est envoyée en entier avant la suivante
+        with self.send_lock:
+            # Un joueur restauré depuis un snapshot n'a pas de socket tant qu'il ne s'est pas reconnecté
+            if self.client_socket is None:
+                return False
+            try:
+                self.client_socket.sendall(data)
+                return True
+            except OSError:
+                return False
 
 class Game:
     def __init__(self, player1, player2, game_id):
@@ -24,6 +54,8 @@ class Game:
         self.turns_count = 0
         self.winner = None
         self.finished = False
+        # Protège le plateau et l'ordre des mises à jour envoyées aux deux joueurs
+        self.lock = threading.Lock()
 
     def make_move(self, player, position):
         if self.current_turn != player or self.finished:
@@ -65,7 +97,7 @@ class Game:
 
     def get_state(self):
         return {
-            "board": self.board,
+            "board": list(self.board),
             "current_turn": self.current_turn.username,
             "turns_count": self.turns_count,
             "finished": self.finished,
@@ -73,7 +105,7 @@ class Game:
         }
 
 class Server:
-    def __init__(self, host="localhost", port=5555):
+    def __init__(self, host="localhost", port=5555, snapshot_path="snapshot.json"):
         self.host = host
         self.port = port
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -82,16 +114,53 @@ class Server:
         self.server_socket.listen(10)
 
         self.queue = []
-        self.active_games = {}
-        self.players = {}
-
-        self.db = Database()
+        self.queue_lock = threading.Lock()
+        self.active_games = StripedDict()
+        self.players = StripedDict()
+        self.restored_queue = {}
+
+        # La base est connectée en arrière-plan : le serveur accepte les connexions
+        # immédiatement et les actions qui en ont besoin attendent db_ready
+        self.db = None
+        self.db_lock = threading.Lock()
+        self.db_ready = threading.Event()
+        self.db_thread = threading.Thread(target=self.connect_database)
+        self.db_thread.daemon = True
+        self.db_thread.start()
+
+        self.chat = ChatManager(self.create_database)
+
+        # Résultats des parties terminées, écrits en base dès qu'elle est prête
+        self.pending_results = []
+        self.results_lock = threading.Lock()
+        self.results_event = threading.Event()
+
+        self.snapshot = Snapshot(snapshot_path)
+        # Capture et écriture ensemble : un snapshot périodique ne peut pas écraser le snapshot final
+        self.snapshot_lock = threading.Lock()
+        self.restore_state(self.snapshot.load())
+
+        self.snapshot_event = threading.Event()
+        if hasattr(signal, "SIGUSR1"):
+            signal.signal(signal.SIGUSR1, lambda signum, frame: self.snapshot_event.set())
+        # SIGTERM est le signal envoyé lors d'un déploiement : prendre un dernier snapshot avant de quitter
+        self.shutdown_lock = threading.Lock()
+        self.shut_down = False
+        signal.signal(signal.SIGTERM, self.handle_sigterm)
 
         self.queue_check_thread = threading.Thread(target=self.check_queue)
         self.queue_check_thread.daemon = True
         self.queue_check_thread.start()
 
-        print(f"Server started on {self.host}:{self.port}")
+        self.snapshot_thread = threading.Thread(target=self.snapshot_loop)
+        self.snapshot_thread.daemon = True
+        self.snapshot_thread.start()
+
+        self.results_thread = threading.Thread(target=self.results_loop)
+        self.results_thread.daemon = True
+        self.results_thread.start()
+
+        print(f"Server started on {self.host}:{self.port} in {(time.perf_counter() - STARTUP_TIME) * 1000:.1f} ms")
 
     def start(self):
         try:
@@ -101,9 +170,44 @@ class Server:
                 client_thread.daemon = True
                 client_thread.start()
         except KeyboardInterrupt:
-            print("Server shutting down...")
+            self.shutdown()
+
+    def shutdown(self):
+        with self.shutdown_lock:
+            if self.shut_down:
+                return
+            self.shut_down = True
+
+        print("Server shutting down...")
+        # Ne plus accepter de connexions avant le snapshot final
+        self.server_socket.close()
+        self.take_snapshot()
+        if self.db:
             self.db.close()
-            self.server_socket.close()
+
+    def handle_sigterm(self, signum, frame):
+        self.shutdown()
+        sys.exit(0)
+
+    def create_database(self):
+        # Import différé : mysql.connector est long à charger
+        from database import Database
+        return Database()
+
+    def connect_database(self):
+        while True:
+            try:
+                self.db = self.create_database()
+                break
+            except Exception as e:
+                print(f"Database connection failed: {str(e)}, retrying in {DB_RETRY_DELAY}s")
+                time.sleep(DB_RETRY_DELAY)
+
+        self.db_ready.set()
+        print(f"Database ready in {(time.perf_counter() - STARTUP_TIME) * 1000:.1f} ms")
+
+    def wait_for_db(self):
+        return self.db_ready.wait(DB_READY_TIMEOUT)
 
     def handle_client(self, client_socket, address):
         try:
@@ -114,16 +218,23 @@ class Server:
                 if message["action"] == "login":
                     username = message["username"]
 
+                    if not self.wait_for_db():
+                        client_socket.sendall(json.dumps({"action": "error", "message": "Server starting, try again"}).encode('utf-8'))
+                        return
+
                     # Vérifier si le joueur existe déjà dans la base de données
-                    player_data = self.db.get_player_by_username(username)
-                    if player_data:
-                        player_id = player_data[0]
-                    else:
-                        player_id = self.db.add_player(username)
+                    with self.db_lock:
+                        player_data = self.db.get_player_by_username(username)
+                        if player_data:
+                            player_id = player_data[0]
+                        else:
+                            player_id = self.db.add_player(username)
 
-                    # Créer un objet Player
-                    player = Player(username, client_socket, address)
-                    player.id = player_id
+                    # Reprendre la partie en cours si le joueur s'était déconnecté
+                    player = self.reclaim_player(username, client_socket, address)
+                    if player is None:
+                        player = Player(username, client_socket, address)
+                        player.id = player_id
                     self.players[client_socket] = player
 
                     # Envoyer une confirmation
@@ -131,20 +242,42 @@ class Server:
                         "action": "login_success",
                         "player_id": player_id
                     }
-                    client_socket.send(json.dumps(response).encode('utf-8'))
+                    player.send(response)
+
+                    if player.in_game:
+                        self.send_game_resume(player)
+                    else:
+                        response = None
+                        with self.queue_lock:
+                            if username in self.restored_queue:
+                                player.join_time = self.restored_queue.pop(username)["join_time"]
+                                self.queue.append(player)
+                                response = {
+                                    "action": "joined_queue",
+                                    "position": len(self.queue),
+                                    "queue_length": len(self.queue),
+                                    "join_time": player.join_time.strftime("%H:%M:%S")
+                                }
+                        if response:
+                            player.send(response)
+                            self.broadcast_queue_update()
 
                     # Attendre d'autres commandes du client
                     self.handle_player_commands(player)
             except json.JSONDecodeError:
-                client_socket.send(json.dumps({"error": "Invalid JSON format"}).encode('utf-8'))
+                client_socket.sendall(json.dumps({"error": "Invalid JSON format"}).encode('utf-8'))
         except Exception as e:
             print(f"Error handling client {address}: {str(e)}")
         finally:
-            if client_socket in self.players:
-                player = self.players[client_socket]
-                if player in self.queue:
-                    self.queue.remove(player)
-                del self.players[client_socket]
+            player = self.players.pop(client_socket)
+            if player:
+                with self.queue_lock:
+                    if player in self.queue:
+                        self.queue.remove(player)
+                # Garder la partie pour permettre au joueur de la reprendre pendant RECLAIM_TIMEOUT
+                if player.client_socket is client_socket:
+                    player.disconnect_time = time.monotonic()
+                    player.client_socket = None
             client_socket.close()
 
     def handle_player_commands(self, player):
@@ -158,38 +291,41 @@ class Server:
                 action = message.get("action")
 
                 if action == "join_queue":
-                    if player in self.queue:
-                        response = {"action": "error", "message": "Already in queue"}
-                    elif player.in_game:
-                        response = {"action": "error", "message": "Already in game"}
-                    else:
-                        self.queue.append(player)
-                        response = {
-                            "action": "joined_queue",
-                            "position": len(self.queue),
-                            "queue_length": len(self.queue),
-                            "join_time": player.join_time.strftime("%H:%M:%S")
-                        }
+                    joined = False
+                    with self.queue_lock:
+                        if player in self.queue:
+                            response = {"action": "error", "message": "Already in queue"}
+                        elif player.in_game:
+                            response = {"action": "error", "message": "Already in game"}
+                        else:
+                            self.queue.append(player)
+                            joined = True
+                            response = {
+                                "action": "joined_queue",
+                                "position": len(self.queue),
+                                "queue_length": len(self.queue),
+                                "join_time": player.join_time.strftime("%H:%M:%S")
+                            }
+                    if joined:
                         self.broadcast_queue_update()
 
-                    player.client_socket.send(json.dumps(response).encode('utf-8'))
+                    player.send(response)
 
                 elif action == "leave_queue":
-                    if player in self.queue:
-                        self.queue.remove(player)
+                    with self.queue_lock:
+                        left = player in self.queue
+                        if left:
+                            self.queue.remove(player)
+                    if left:
                         response = {"action": "left_queue"}
                         self.broadcast_queue_update()
                     else:
                         response = {"action": "error", "message": "Not in queue"}
 
-                    player.client_socket.send(json.dumps(response).encode('utf-8'))
+                    player.send(response)
 
                 elif action == "make_move":
-                    game = None
-                    for game_id, g in self.active_games.items():
-                        if g.player1 == player or g.player2 == player:
-                            game = g
-                            break
+                    game = player.game
 
                     if not game:
                         response = {"action": "error", "message": "Not in game"}
@@ -198,70 +334,52 @@ class Server:
                         if position is None:
                             response = {"action": "error", "message": "No position provided"}
                         else:
-                            success = game.make_move(player, position)
-                            if success:
-                                game_state = game.get_state()
-                                game_update = {
-                                    "action": "game_update",
-                                    "game_state": game_state
-                                }
-                                game.player1.client_socket.send(json.dumps(game_update).encode('utf-8'))
-                                game.player2.client_socket.send(json.dumps(game_update).encode('utf-8'))
-
-                                if game.finished:
-                                    winner_id = game.winner.id if game.winner else None
-                                    self.db.update_game_winner(game.game_id, winner_id, game.turns_count)
-
-                                    end_game = {
-                                        "action": "game_over",
-                                        "winner": game.winner.username if game.winner else None,
-                                        "message": f"{game.winner.username} a gagné!" if game.winner else "Match nul!"
+                            with game.lock:
+                                success = game.make_move(player, position)
+                                finished = success and game.finished
+                                if success:
+                                    game_update = {
+                                        "action": "game_update",
+                                        "game_state": game.get_state()
                                     }
-                                    game.player1.client_socket.send(json.dumps(end_game).encode('utf-8'))
-                                    game.player2.client_socket.send(json.dumps(end_game).encode('utf-8'))
+                                    game.player1.send(game_update)
+                                    game.player2.send(game_update)
 
-                                    game.player1.in_game = False
-                                    game.player2.in_game = False
-
-                                    del self.active_games[game.game_id]
+                            if success:
+                                # Seul le thread qui a joué le dernier coup voit la partie se terminer
+                                if finished:
+                                    self.end_game(game)
 
                                 response = {"action": "move_success"}
                             else:
                                 response = {"action": "error", "message": "Invalid move"}
 
-                    player.client_socket.send(json.dumps(response).encode('utf-8'))
+                    player.send(response)
 
                 elif action == "chat_message":
-                    game = None
-                    for game_id, g in self.active_games.items():
-                        if g.player1 == player or g.player2 == player:
-                            game = g
-                            break
+                    game = player.game
 
                     if not game:
                         response = {"action": "error", "message": "Not in game"}
-                        player.client_socket.send(json.dumps(response).encode('utf-8'))
+                        player.send(response)
                     else:
                         message_content = message.get("message")
                         if not message_content:
                             response = {"action": "error", "message": "No message content"}
-                            player.client_socket.send(json.dumps(response).encode('utf-8'))
+                            player.send(response)
                         else:
-                            chat_message = {
-                                "action": "chat_message",
-                                "from": player.username,
-                                "message": message_content,
-                                "time": datetime.now().strftime("%H:%M:%S")
-                            }
-
+                            # Le message est envoyé par le thread du chat, regroupé avec les suivants
                             opponent = game.player2 if player == game.player1 else game.player1
-                            opponent.client_socket.send(json.dumps(chat_message).encode('utf-8'))
+                            self.chat.post(game.game_id, player, opponent, message_content)
 
                             response = {"action": "message_sent"}
-                            player.client_socket.send(json.dumps(response).encode('utf-8'))
+                            player.send(response)
 
                 elif action == "get_stats":
-                    stats = self.db.get_player_stats(player.id)
+                    stats = None
+                    if self.wait_for_db():
+                        with self.db_lock:
+                            stats = self.db.get_player_stats(player.id)
                     if stats:
                         total_games, wins = stats
                         total_games = int(total_games) if total_games is not None else 0
@@ -282,28 +400,119 @@ class Server:
                             "losses": 0
                         }
 
-                    player.client_socket.send(json.dumps(response).encode('utf-8'))
+                    player.send(response)
 
             except json.JSONDecodeError:
-                player.client_socket.send(json.dumps({"error": "Invalid JSON format"}).encode('utf-8'))
+                player.send({"error": "Invalid JSON format"})
             except Exception as e:
                 print(f"Error handling command from {player.username}: {str(e)}")
                 break
 
+    def end_game(self, game, message=None):
+        # Ne pas bloquer le thread du coup : le résultat est enregistré par results_loop
+        self.save_result(game.game_id, game.winner.id if game.winner else None, game.turns_count)
+
+        # Envoyer les derniers messages du chat avant l'annonce de fin de partie
+        self.chat.close_room(game.game_id)
+
+        if message is None:
+            message = f"{game.winner.username} a gagné!" if game.winner else "Match nul!"
+        game_over = {
+            "action": "game_over",
+            "winner": game.winner.username if game.winner else None,
+            "message": message
+        }
+        game.player1.send(game_over)
+        game.player2.send(game_over)
+
+        self.active_games.pop(game.game_id)
+
+        for p in (game.player1, game.player2):
+            p.game = None
+            p.in_game = False
+
+    def save_result(self, game_id, winner_id, turns_count):
+        with self.results_lock:
+            self.pending_results.append((game_id, winner_id, turns_count))
+        self.results_event.set()
+
+    def results_loop(self):
+        self.db_ready.wait()
+        while True:
+            self.results_event.wait()
+            self.results_event.clear()
+            while True:
+                # Le résultat reste dans pending_results (et donc dans les snapshots) tant qu'il n'est pas écrit
+                with self.results_lock:
+                    if not self.pending_results:
+                        break
+                    result = self.pending_results[0]
+                try:
+                    with self.db_lock:
+                        self.db.update_game_winner(*result)
+                except Exception as e:
+                    print(f"Error saving result of game {result[0]}: {str(e)}, retrying in {RESULT_RETRY_DELAY}s")
+                    time.sleep(RESULT_RETRY_DELAY)
+                    continue
+                with self.results_lock:
+                    self.pending_results.remove(result)
+
+    def expire_abandoned_games(self):
+        now = time.monotonic()
+        for game in self.active_games.values():
+            with game.lock:
+                if game.finished:
+                    continue
+                gone = [p for p in (game.player1, game.player2)
+                        if p.client_socket is None and p.disconnect_time is not None
+                        and now - p.disconnect_time > RECLAIM_TIMEOUT]
+                if not gone:
+                    continue
+
+                # Forfait : le joueur resté connecté gagne, sinon la partie est close sans vainqueur
+                game.finished = True
+                remaining = [p for p in (game.player1, game.player2) if p not in gone and p.client_socket is not None]
+                game.winner = remaining[0] if len(remaining) == 1 else None
+
+            if game.winner:
+                self.end_game(game, f"{gone[0].username} a abandonné, {game.winner.username} a gagné!")
+            else:
+                self.end_game(game, "Partie abandonnée")
+
+    def expire_restored_queue(self):
+        now = time.monotonic()
+        with self.queue_lock:
+            expired = [username for username, entry in self.restored_queue.items()
+                       if now - entry["restored_at"] > RECLAIM_TIMEOUT]
+            for username in expired:
+                del self.restored_queue[username]
+
     def check_queue(self):
         while True:
             try:
-                if len(self.queue) >= 2:
-                    player1 = self.queue.pop(0)
-                    player2 = self.queue.pop(0)
+                self.expire_abandoned_games()
+                self.expire_restored_queue()
 
-                    player1.in_game = True
-                    player2.in_game = True
+                pair = None
+                with self.queue_lock:
+                    if len(self.queue) >= 2 and self.db_ready.is_set():
+                        # Retirer les deux joueurs ensemble : aucun autre thread ne les voit à moitié appariés
+                        pair = (self.queue.pop(0), self.queue.pop(0))
+                        for p in pair:
+                            p.in_game = True
 
-                    game_id = self.db.create_game(player1.id, player2.id)
+                if pair:
+                    player1, player2 = pair
+
+                    with self.db_lock:
+                        game_id = self.db.create_game(player1.id, player2.id)
 
                     game = Game(player1, player2, game_id)
+                    self.chat.open_room(game_id)
                     self.active_games[game_id] = game
+                    # Publication de la partie : les threads des joueurs la lisent via player.game
+                    player1.game = game
+                    player2.game = game
 
                     game_start = {
                         "action": "game_start",
@@ -311,7 +520,7 @@ class Server:
                         "symbol": "X",
                         "your_turn": True
                     }
-                    player1.client_socket.send(json.dumps(game_start).encode('utf-8'))
+                    player1.send(game_start)
 
                     game_start = {
                         "action": "game_start",
@@ -319,27 +528,121 @@ class Server:
                         "symbol": "O",
                         "your_turn": False
                     }
-                    player2.client_socket.send(json.dumps(game_start).encode('utf-8'))
+                    player2.send(game_start)
 
                     self.broadcast_queue_update()
 
-                time.sleep(1)
+                time.sleep(QUEUE_CHECK_INTERVAL)
             except Exception as e:
                 print(f"Error in queue check: {str(e)}")
 
+    def restore_state(self, state):
+        if not state:
+            return
+
+        for game_data in state.get("games", []):
+            player1 = Player(game_data["player1"]["username"], None, None)
+            player1.id = game_data["player1"]["id"]
+            player1.in_game = True
+            player1.disconnect_time = time.monotonic()
+            player2 = Player(game_data["player2"]["username"], None, None)
+            player2.id = game_data["player2"]["id"]
+            player2.in_game = True
+            player2.disconnect_time = time.monotonic()
+
+            game = Game(player1, player2, game_data["game_id"])
+            game.board = list(game_data["board"])
+            game.turns_count = game_data["turns_count"]
+            game.current_turn = player1 if game_data["current_turn"] == player1.username else player2
+
+            # Ancien snapshot ou fichier modifié : ignorer une partie déjà terminée
+            if game.check_winner() or game.board.count(" ") == 0:
+                print(f"Ignoring finished game {game.game_id} in snapshot")
+                continue
+
+            player1.game = game
+            player2.game = game
+            self.chat.open_room(game.game_id, game_data.get("chat"), game_data.get("chat_log"))
+            self.active_games[game.game_id] = game
+
+        for game_id, winner_id, turns_count in state.get("results", []):
+            self.save_result(game_id, winner_id, turns_count)
+
+        # Places en file gardées pendant RECLAIM_TIMEOUT, comme les places dans une partie
+        restored_at = time.monotonic()
+        self.restored_queue = {
+            p["username"]: {"id": p["id"], "join_time": datetime.fromisoformat(p["join_time"]), "restored_at": restored_at}
+            for p in state.get("queue", [])
+        }
+
+        print(f"Restored {len(self.active_games)} games and {len(self.restored_queue)} queued players from snapshot")
+
+    def reclaim_player(self, username, client_socket, address):
+        for game in self.active_games.values():
+            with game.lock:
+                for p in (game.player1, game.player2):
+                    if p.username == username and p.client_socket is None:
+                        p.client_socket = client_socket
+                        p.address = address
+                        p.disconnect_time = None
+                        return p
+        return None
+
+    def send_game_resume(self, player):
+        game = player.game
+        if not game:
+            return
+
+        opponent = game.player2 if player == game.player1 else game.player1
+        with game.lock:
+            game_resume = {
+                "action": "game_resume",
+                "opponent": opponent.username,
+                "symbol": "X" if player == game.player1 else "O",
+                "game_state": game.get_state(),
+                "chat_history": self.chat.get_history(game.game_id)
+            }
+            player.send(game_resume)
+
+    def take_snapshot(self):
+        try:
+            with self.snapshot_lock:
+                with self.queue_lock:
+                    queue = [(p.username, p.id, p.join_time) for p in self.queue]
+                    # Joueurs restaurés pas encore reconnectés : garder leur place au prochain redémarrage
+                    queue += [(username, entry["id"], entry["join_time"]) for username, entry in self.restored_queue.items()]
+                with self.results_lock:
+                    results = list(self.pending_results)
+                state = self.snapshot.capture(queue, self.active_games, self.chat, results)
+                self.snapshot.write(state)
+        except Exception as e:
+            print(f"Error taking snapshot: {str(e)}")
+
+    def snapshot_loop(self):
+        # Snapshot périodique, ou immédiat à la réception de SIGUSR1
+        while True:
+            self.snapshot_event.wait(SNAPSHOT_INTERVAL)
+            self.snapshot_event.clear()
+            if self.shut_down:
+                return
+            self.take_snapshot()
+
     def broadcast_queue_update(self):
+        with self.queue_lock:
+            queue = list(self.queue)
+
         queue_update = {
             "action": "queue_update",
-            "queue_length": len(self.queue),
-            "players": [{"username": p.username, "join_time": p.join_time.strftime("%H:%M:%S")} for p in self.queue]
+            "queue_length": len(queue),
+            "players": [{"username": p.username, "join_time": p.join_time.strftime("%H:%M:%S")} for p in queue]
         }
 
-        for player in self.queue:
-            try:
-                player.client_socket.send(json.dumps(queue_update).encode('utf-8'))
-            except:
-                pass
+        for player in queue:
+            player.send(queue_update)
 
 if __name__ == "__main__":
-    server = Server()
+    # Usage : python3 server.py [port] [fichier snapshot]
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5555
+    snapshot_path = sys.argv[2] if len(sys.argv) > 2 else "snapshot.json"
+    server = Server(port=port, snapshot_path=snapshot_path)
     server.start()
\ No newline at end of file
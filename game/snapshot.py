@@ -0,0 +1,70 @@
+import json
+import os
+
+SNAPSHOT_VERSION = 1
+
+class Snapshot:
+    def __init__(self, path="snapshot.json"):
+        self.path = path
+        self.last_data = None
+
+    def capture(self, queue, active_games, chat=None, results=None):
+        # Copie rapide de l'état : on ne garde que des types simples pour
+        # pouvoir sérialiser et écrire sur disque hors du chemin des coups
+        games = []
+        for game in active_games.values():
+            # Verrou de la partie tenu seulement le temps de la copie
+            with game.lock:
+                # Une partie terminée attend seulement d'être retirée : ne pas la restaurer
+                if game.finished:
+                    continue
+                games.append({
+                    "game_id": game.game_id,
+                    "player1": {"username": game.player1.username, "id": game.player1.id},
+                    "player2": {"username": game.player2.username, "id": game.player2.id},
+                    "board": "".join(game.board),
+                    "current_turn": game.current_turn.username,
+                    "turns_count": game.turns_count
+                })
+            games[-1]["chat"] = chat.get_history(game.game_id) if chat else []
+            games[-1]["chat_log"] = chat.get_log(game.game_id) if chat else []
+
+        return {
+            "version": SNAPSHOT_VERSION,
+            "queue": [{"username": username, "id": player_id, "join_time": join_time.isoformat()}
+                      for username, player_id, join_time in queue],
+            "games": games,
+            # Résultats de parties pas encore enregistrés en base
+            "results": [list(result) for result in results or []]
+        }
+
+    def write(self, state):
+        data = json.dumps(state, separators=(",", ":"))
+        if data == self.last_data:
+            return False
+
+        # Écriture atomique : un crash pendant l'écriture ne corrompt pas le dernier snapshot
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+
+        self.last_data = data
+        return True
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return None
+
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"Unable to load snapshot {self.path}: {str(e)}")
+            return None
+
+        if state.get("version") != SNAPSHOT_VERSION:
+            print(f"Ignoring snapshot {self.path}: unsupported version")
+            return None
+
+        return state
@@ -0,0 +1,426 @@
+import json
+import os
+import queue
+import random
+import socket
+import tempfile
+import threading
+import time
+import unittest
+
+import chat
+import server
+from concurrency import StripedDict
+from network import Connection
+
+TIMEOUT = 30
+
+def run_concurrently(target, args_list):
+    # Lance un thread par jeu d'arguments et renvoie les exceptions levées dans les threads
+    errors = []
+
+    def run(*args):
+        try:
+            target(*args)
+        except BaseException as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=args) for args in args_list]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(TIMEOUT)
+        if t.is_alive():
+            errors.append(TimeoutError(f"{t.name} still running"))
+    return errors
+
+class FakeDatabase:
+    # Remplace MySQL : mêmes méthodes que Database, protégées par un verrou
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.next_game_id = 0
+        self.created_games = []
+        self.finished_games = {}
+        self.chat_messages = []
+
+    def close(self):
+        pass
+
+    def get_player_by_username(self, username):
+        return None
+
+    def add_player(self, username):
+        return 0
+
+    def create_game(self, player1_id, player2_id):
+        with self.lock:
+            self.next_game_id += 1
+            self.created_games.append((self.next_game_id, player1_id, player2_id))
+            return self.next_game_id
+
+    def update_game_winner(self, game_id, winner_id, turns_count):
+        with self.lock:
+            self.finished_games.setdefault(game_id, []).append((winner_id, turns_count))
+
+    def add_chat_messages(self, messages):
+        with self.lock:
+            self.chat_messages.extend(messages)
+
+    def get_player_stats(self, player_id):
+        return (0, 0)
+
+class StubServer(server.Server):
+    def __init__(self, db, **kwargs):
+        self.fake_db = db
+        super().__init__(**kwargs)
+
+    def create_database(self):
+        return self.fake_db
+
+class Client:
+    # Côté client d'un joueur, branché sur handle_player_commands par une socketpair
+    def __init__(self, srv, username, player_id):
+        server_end, client_end = socket.socketpair()
+        self.player = server.Player(username, server_end, None)
+        self.player.id = player_id
+        srv.players[server_end] = self.player
+
+        self.connection = Connection(None, None)
+        self.connection.socket = client_end
+        self.connection.listen_thread = threading.Thread(target=self.connection.listen)
+        self.connection.listen_thread.daemon = True
+        self.connection.listen_thread.start()
+
+        self.received = []
+        self.handler = threading.Thread(target=srv.handle_player_commands, args=(self.player,))
+        self.handler.daemon = True
+        self.handler.start()
+
+    def request(self, message, replies):
+        # Attendre la réponse directe avant d'envoyer la commande suivante
+        self.connection.send(message)
+        deadline = time.monotonic() + TIMEOUT
+        while True:
+            reply = self.connection.messages.get(timeout=max(0, deadline - time.monotonic()))
+            self.received.append(reply)
+            if reply.get("action") in replies:
+                return reply
+
+    def drain(self):
+        while True:
+            try:
+                self.received.append(self.connection.messages.get_nowait())
+            except queue.Empty:
+                return
+
+    def actions(self, action):
+        return [m for m in self.received if m.get("action") == action]
+
+    def close(self):
+        self.connection.close()
+        self.player.client_socket.close()
+
+class ServerTestCase(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db = FakeDatabase()
+        self.server = StubServer(self.db, port=0, snapshot_path=os.path.join(self.tmp_dir.name, "snapshot.json"))
+        self.assertTrue(self.server.db_ready.wait(TIMEOUT))
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        self.server.server_socket.close()
+        self.tmp_dir.cleanup()
+
+class ConcurrentGamesTest(ServerTestCase):
+    GAMES = 30
+
+    def play(self, client):
+        while not client.actions("game_over"):
+            if random.random() < 0.25:
+                client.request({"action": "chat_message", "message": f"gl {client.player.username}"},
+                               ("message_sent", "error"))
+            else:
+                client.request({"action": "make_move", "position": random.randrange(9)},
+                               ("move_success", "error", "game_over"))
+            client.drain()
+            time.sleep(random.uniform(0, 0.002))
+
+    def test_each_game_finishes_exactly_once(self):
+        games = []
+        for i in range(self.GAMES):
+            player1 = Client(self.server, f"a{i}", 2 * i)
+            player2 = Client(self.server, f"b{i}", 2 * i + 1)
+            self.clients += [player1, player2]
+
+            # Même transmission que check_queue : la partie est publiée via player.game
+            game = server.Game(player1.player, player2.player, 1000 + i)
+            self.server.chat.open_room(game.game_id)
+            self.server.active_games[game.game_id] = game
+            for p in (player1.player, player2.player):
+                p.in_game = True
+                p.game = game
+            games.append(game)
+
+        self.assertEqual(run_concurrently(self.play, [(c,) for c in self.clients]), [])
+
+        self.assertEqual(len(self.server.active_games), 0)
+        # Les résultats sont écrits en base par results_loop
+        deadline = time.monotonic() + TIMEOUT
+        while len(self.db.finished_games) < len(games) and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(sorted(self.db.finished_games), [g.game_id for g in games])
+        for game in games:
+            self.assertEqual(len(self.db.finished_games[game.game_id]), 1)
+            self.assertEqual(self.db.finished_games[game.game_id][0][1], 9 - game.board.count(" "))
+
+        for client in self.clients:
+            client.drain()
+            # Chaque trame est arrivée entière : une seule fin de partie par joueur
+            self.assertEqual(len(client.actions("game_over")), 1)
+            self.assertIsNone(client.player.game)
+            self.assertFalse(client.player.in_game)
+
+class QueueTest(ServerTestCase):
+    PLAYERS = 40
+    ROUNDS = 30
+
+    def setUp(self):
+        self.check_interval = server.QUEUE_CHECK_INTERVAL
+        server.QUEUE_CHECK_INTERVAL = 0.001
+        super().setUp()
+
+    def tearDown(self):
+        super().tearDown()
+        server.QUEUE_CHECK_INTERVAL = self.check_interval
+
+    def churn(self, client):
+        for _ in range(self.ROUNDS):
+            action = random.choice(["join_queue", "leave_queue"])
+            client.request({"action": action}, ("joined_queue", "left_queue", "error"))
+            time.sleep(random.uniform(0, 0.002))
+
+    def test_join_leave_against_matchmaking(self):
+        for i in range(self.PLAYERS):
+            self.clients.append(Client(self.server, f"q{i}", i))
+
+        self.assertEqual(run_concurrently(self.churn, [(c,) for c in self.clients]), [])
+        # Laisser check_queue apparier les derniers joueurs en file
+        deadline = time.monotonic() + TIMEOUT
+        while len(self.server.queue) >= 2 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.1)
+
+        with self.server.queue_lock:
+            queued = list(self.server.queue)
+        self.assertLessEqual(len(queued), 1)
+        self.assertEqual(len(queued), len(set(queued)))
+
+        self.assertTrue(self.db.created_games)
+        paired = [p for _, p1, p2 in self.db.created_games for p in (p1, p2)]
+        self.assertEqual(len(paired), len(set(paired)))
+
+        for client in self.clients:
+            client.drain()
+            player = client.player
+            self.assertFalse(player.in_game and player in queued)
+            if player.id in paired:
+                self.assertTrue(player.in_game)
+                self.assertIs(self.server.active_games.get(player.game.game_id), player.game)
+                self.assertEqual(len(client.actions("game_start")), 1)
+            else:
+                self.assertFalse(player.in_game)
+                self.assertEqual(client.actions("game_start"), [])
+                # Aucun joueur perdu : sa dernière réponse dit s'il doit être dans la file
+                last = [m["action"] for m in client.received if m.get("action") in ("joined_queue", "left_queue")]
+                self.assertEqual(player in queued, bool(last) and last[-1] == "joined_queue")
+
+class WarmRestartTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "snapshot.json")
+        self.reclaim_timeout = server.RECLAIM_TIMEOUT
+
+    def tearDown(self):
+        server.RECLAIM_TIMEOUT = self.reclaim_timeout
+        self.server.server_socket.close()
+        self.tmp_dir.cleanup()
+
+    def start_server(self, state):
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(state, f)
+        self.server = StubServer(FakeDatabase(), port=0, snapshot_path=self.path)
+
+    def saved_state(self):
+        self.server.take_snapshot()
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_restored_queue_kept_until_reclaim_timeout(self):
+        queued = {"username": "q", "id": 3, "join_time": "2026-10-19T10:00:00"}
+        self.start_server({"version": 1, "queue": [queued], "games": []})
+
+        # Pas encore reconnecté : sa place survit à un nouveau snapshot
+        self.assertEqual(self.saved_state()["queue"], [queued])
+
+        server.RECLAIM_TIMEOUT = 0
+        time.sleep(0.01)
+        self.server.expire_restored_queue()
+        self.assertEqual(self.saved_state()["queue"], [])
+
+class LateDatabaseTest(unittest.TestCase):
+    def test_result_saved_once_database_is_ready(self):
+        db = FakeDatabase()
+        available = threading.Event()
+        retry_delay = server.DB_RETRY_DELAY
+        server.DB_RETRY_DELAY = 0.01
+
+        class LateServer(StubServer):
+            def create_database(self):
+                if not available.is_set():
+                    raise ConnectionError("database not ready")
+                return db
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            srv = LateServer(db, port=0, snapshot_path=os.path.join(tmp_dir, "snapshot.json"))
+            try:
+                player1 = server.Player("a", None, None)
+                player2 = server.Player("b", None, None)
+                player1.id, player2.id = 1, 2
+                game = server.Game(player1, player2, 42)
+                srv.chat.open_room(game.game_id)
+                srv.active_games[game.game_id] = game
+                for position, player in [(0, player1), (3, player2), (1, player1), (4, player2), (2, player1)]:
+                    self.assertTrue(game.make_move(player, position))
+
+                # La fin de partie ne doit ni attendre la base ni perdre le résultat
+                start = time.monotonic()
+                srv.end_game(game)
+                self.assertLess(time.monotonic() - start, 1)
+                self.assertEqual(len(srv.active_games), 0)
+                self.assertEqual(srv.snapshot.capture([], srv.active_games, None, srv.pending_results)["results"],
+                                 [[42, 1, 5]])
+                self.assertEqual(db.finished_games, {})
+
+                available.set()
+                deadline = time.monotonic() + TIMEOUT
+                while not db.finished_games and time.monotonic() < deadline:
+                    time.sleep(0.01)
+                self.assertEqual(db.finished_games, {42: [(1, 5)]})
+            finally:
+                server.DB_RETRY_DELAY = retry_delay
+                srv.server_socket.close()
+
+class ChatLogTest(unittest.TestCase):
+    def test_log_flushed_in_chunks(self):
+        db = FakeDatabase()
+        manager = chat.ChatManager(lambda: db)
+        manager.open_room(1)
+        sender = server.Player("a", None, None)
+        sender.id = 7
+        recipient = server.Player("b", None, None)
+
+        total = 2 * chat.CHAT_LOG_FLUSH_SIZE + 3
+        for i in range(total):
+            manager.post(1, sender, recipient, f"msg {i}")
+            self.assertLess(len(manager.get_log(1)), chat.CHAT_LOG_FLUSH_SIZE)
+        manager.close_room(1)
+
+        deadline = time.monotonic() + TIMEOUT
+        while len(db.chat_messages) < total and time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertEqual([row[2] for row in db.chat_messages], [f"msg {i}" for i in range(total)])
+
+class ConnectionParseTest(unittest.TestCase):
+    # Trames telles que le serveur les envoie (Player.send) : littéraux, objets imbriqués, \u00e9
+    FRAMES = [
+        {"action": "game_over", "winner": None, "message": "bob a gagné!"},
+        {"action": "game_update", "game_state": {"board": ["X", " ", "O", " ", " ", " ", " ", " ", " "],
+                                                 "current_turn": "bob", "turns_count": 2,
+                                                 "finished": False, "winner": None}},
+        {"action": "chat_batch", "messages": [{"from": "élodie", "message": "\"{ça}\" \\ ok", "time": "12:00:00"}]},
+    ]
+
+    def received(self, chunks):
+        connection = Connection(None, None)
+        for chunk in chunks:
+            connection.receive(chunk)
+        return connection.get_messages(100)
+
+    def check_every_split(self, data, expected):
+        for i in range(len(data) + 1):
+            self.assertEqual(self.received([data[:i], data[i:]]), expected, f"coupure à l'octet {i}")
+
+    def test_server_frames_split_at_every_byte(self):
+        for frame in self.FRAMES:
+            self.check_every_split(json.dumps(frame).encode('utf-8'), [frame])
+
+    def test_utf8_frame_split_at_every_byte(self):
+        frame = self.FRAMES[2]
+        self.check_every_split(json.dumps(frame, ensure_ascii=False).encode('utf-8'), [frame])
+
+    def test_consecutive_frames_split_at_every_byte(self):
+        data = b"".join(json.dumps(frame).encode('utf-8') for frame in self.FRAMES)
+        self.check_every_split(data, self.FRAMES)
+
+    def test_malformed_data_skipped(self):
+        frame = self.FRAMES[0]
+        data = json.dumps(frame).encode('utf-8')
+        self.assertEqual(self.received([b"garbage" + data]), [frame])
+        self.assertEqual(self.received([b'{"a": 1,}' + data]), [frame])
+        self.assertEqual(self.received([b'{"a": 1,}', data]), [frame])
+
+class StripedDictTest(unittest.TestCase):
+    THREADS = 16
+    KEYS = 2000
+
+    def test_insert_and_remove_under_contention(self):
+        d = StripedDict()
+        stop = threading.Event()
+
+        def writer(t):
+            for i in range(self.KEYS):
+                d[(t, i)] = i
+            for i in range(0, self.KEYS, 2):
+                self.assertEqual(d.pop((t, i)), i)
+
+        def reader():
+            while not stop.is_set():
+                for value in d.values():
+                    self.assertIsInstance(value, int)
+                len(d)
+
+        reader_errors = []
+        readers = threading.Thread(target=lambda: reader_errors.extend(run_concurrently(reader, [(), ()])))
+        readers.start()
+        self.assertEqual(run_concurrently(writer, [(t,) for t in range(self.THREADS)]), [])
+        stop.set()
+        readers.join()
+        self.assertEqual(reader_errors, [])
+
+        self.assertEqual(len(d), self.THREADS * self.KEYS // 2)
+        for t in range(self.THREADS):
+            for i in range(self.KEYS):
+                self.assertEqual((t, i) in d, i % 2 == 1)
+
+    def test_each_key_popped_once(self):
+        d = StripedDict()
+        for i in range(self.KEYS):
+            d[i] = i
+        popped = [[] for _ in range(self.THREADS)]
+
+        def popper(t):
+            for i in range(self.KEYS):
+                if d.pop(i) is not None:
+                    popped[t].append(i)
+
+        self.assertEqual(run_concurrently(popper, [(t,) for t in range(self.THREADS)]), [])
+
+        all_popped = [i for keys in popped for i in keys]
+        self.assertEqual(sorted(all_popped), list(range(self.KEYS)))
+        self.assertEqual(len(d), 0)
+
+if __name__ == "__main__":
+    unittest.main()